@@ -1,6 +1,7 @@
+import functools
 import numpy as np
-from scipy.optimize import minimize
 import pandas as pd
+from reflux import reflux_cost, solve_default_reflux, solve_reflux
 
 class Component:
     def __init__(self, name, molecular_weight, heat_of_vaporization, vapor_pressure_coeff, liquid_density):
@@ -10,6 +11,36 @@ class Component:
         self.vapor_pressure_coeff = vapor_pressure_coeff
         self.liquid_density = liquid_density
 
+_TEMPS = np.arange(300, 400, 10)
+_DT = (_TEMPS - 300)/100
+_TEMPS.flags.writeable = False
+_DT.flags.writeable = False
+
+@functools.lru_cache(maxsize=32)
+def _relative_volatility(comp_key):
+    rel_vol = np.exp(-np.array([coeff for _, coeff in comp_key]))
+    rel_vol.flags.writeable = False
+    return rel_vol
+
+# Pressure tables are (n_temperatures, n_components) for VLE and
+# (n_temperatures, n_pairs) for VLLE, matching stage_by_stage.VLEData.
+@functools.lru_cache(maxsize=32)
+def _vle_table(comp_key):
+    coeffs = np.array([coeff for _, coeff in comp_key])
+    P = 101.325 * np.exp(np.outer(_DT, coeffs))
+    P.flags.writeable = False
+    return P
+
+@functools.lru_cache(maxsize=32)
+def _vlle_table(comp_key):
+    coeffs = np.array([coeff for _, coeff in comp_key])
+    iu, ju = np.triu_indices(len(comp_key), k=1)
+    avg = 0.5 * (coeffs[:, None] + coeffs[None, :])
+    keys = tuple(f"{comp_key[i][0]}-{comp_key[j][0]}" for i, j in zip(iu, ju))
+    P = 101.325 * np.exp(np.outer(_DT, avg[iu, ju]))
+    P.flags.writeable = False
+    return keys, P
+
 class DistillationColumn:
     def __init__(self, components, feed, reflux_ratio, number_of_stages, feed_stage, condenser_type):
         self.components = components
@@ -18,62 +49,50 @@ class DistillationColumn:
         self.number_of_stages = number_of_stages
         self.feed_stage = feed_stage
         self.condenser_type = condenser_type
-        self.relative_volatility = self.calculate_relative_volatility()
+        self.name_to_idx = {comp.name: i for i, comp in enumerate(components)}
+        self._comp_key = tuple((comp.name, comp.vapor_pressure_coeff) for comp in components)
+        self.rel_vol_arr = self.calculate_relative_volatility()
+        self.relative_volatility = self.view(self.rel_vol_arr)
         self.vle_data = self.generate_vle_data()
         self.vlle_data = self.generate_vlle_data()
         
     def calculate_relative_volatility(self):
-        volatilities = {}
-        for comp in self.components:
-            volatilities[comp.name] = np.exp(-comp.vapor_pressure_coeff)
-        return volatilities
+        return _relative_volatility(self._comp_key)
+
+    def view(self, arr):
+        return {name: arr[i] for name, i in self.name_to_idx.items()}
     
     def generate_vle_data(self):
-        data = {}
-        for comp in self.components:
-            data[comp.name] = []
-            for T in range(300, 400, 10):
-                P = 101.325 * np.exp(comp.vapor_pressure_coeff * (T - 300)/100)
-                data[comp.name].append({'Temperature': T, 'Pressure': P})
-        return data
+        self._P = _vle_table(self._comp_key)
+        return self._P
     
     def generate_vlle_data(self):
-        data = {}
-        for i, comp1 in enumerate(self.components):
-            for j, comp2 in enumerate(self.components):
-                if i < j:
-                    key = f"{comp1.name}-{comp2.name}"
-                    data[key] = []
-                    for T in range(300, 400, 10):
-                        P = 101.325 * np.exp((comp1.vapor_pressure_coeff + comp2.vapor_pressure_coeff)/2 * (T - 300)/100)
-                        data[key].append({'Temperature': T, 'Pressure': P})
-        return data
+        keys, self.vlle_P = _vlle_table(self._comp_key)
+        self.vlle_keys = list(keys)
+        return self.vlle_P
+
+    def get_vlle_data(self):
+        return {key: self.vlle_P[:, k] for k, key in enumerate(self.vlle_keys)}
     
-    def equilibrium_ratios(self, x, T):
-        ratios = {}
-        for comp in self.components:
-            ratios[comp.name] = self.relative_volatility[comp.name] * x[comp.name]
-        return ratios
+    def equilibrium_ratios(self, x_arr, T):
+        return self.rel_vol_arr * x_arr
     
     def cost_function(self, reflux_ratio):
-        total_cost = 0
-        for stage in range(1, self.number_of_stages + 1):
-            stage_cost = reflux_ratio * stage
-            total_cost += stage_cost
-        return total_cost
+        return reflux_cost(reflux_ratio, self.number_of_stages)
     
     def optimize_reflux_ratio(self):
-        result = minimize(self.cost_function, self.reflux_ratio, bounds=[(1.0, 10.0)])
-        self.reflux_ratio = result.x[0]
+        if type(self).cost_function is DistillationColumn.cost_function:
+            self.reflux_ratio = solve_default_reflux(self.number_of_stages, 1.0, 10.0)
+        else:
+            self.reflux_ratio = solve_reflux(self.cost_function, 1.0, 10.0, self.reflux_ratio)
         return self.reflux_ratio
     
     def simulate(self):
         optimized_reflux = self.optimize_reflux_ratio()
-        stages = []
-        for stage in range(1, self.number_of_stages + 1):
-            stage_data = {'Stage': stage, 'Reflux Ratio': optimized_reflux}
-            stages.append(stage_data)
-        return pd.DataFrame(stages)
+        return pd.DataFrame({
+            'Stage': np.arange(1, self.number_of_stages + 1),
+            'Reflux Ratio': np.full(self.number_of_stages, optimized_reflux)
+        })
 
 def main():
     components = [
@@ -84,7 +103,8 @@ def main():
     feed = {'A': 0.5, 'B': 0.3, 'C': 0.2}
     column = DistillationColumn(components, feed, reflux_ratio=1.5, number_of_stages=20, feed_stage=10, condenser_type='total')
     simulation_results = column.simulate()
-    simulation_results.to_csv('distillation_results.csv', index=False)
+    with open('distillation_results.csv', 'w', buffering=1 << 20, newline='') as f:
+        simulation_results.to_csv(f, index=False)
     
 if __name__ == "__main__":
     main()
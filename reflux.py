@@ -0,0 +1,21 @@
+import functools
+import numpy as np
+
+def reflux_cost(reflux_ratio, num_stages):
+    total_cost = 0
+    for stage in range(1, num_stages + 1):
+        stage_cost = reflux_ratio * stage
+        total_cost += stage_cost
+    return total_cost
+
+def reflux_cost_grad(reflux_ratio, num_stages):
+    return np.array([num_stages * (num_stages + 1)/2])
+
+def solve_reflux(cost, lb, ub, x0, jac=None):
+    from scipy.optimize import minimize
+    result = minimize(cost, x0, jac=jac, bounds=[(lb, ub)])
+    return result.x[0]
+
+@functools.lru_cache(maxsize=128)
+def solve_default_reflux(num_stages, lb, ub):
+    return lb if reflux_cost_grad(lb, num_stages)[0] >= 0 else ub
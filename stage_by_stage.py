@@ -1,7 +1,6 @@
 import numpy as np
 import pandas as pd
-from scipy.optimize import minimize
-import matplotlib.pyplot as plt
+from reflux import reflux_cost, solve_default_reflux, solve_reflux
 
 class Component:
     def __init__(self, name, molecular_weight, heat_of_vaporization, vapor_pressure_coeff, liquid_density, specific_heat_liquid, specific_heat_vapor):
@@ -13,18 +12,21 @@ class Component:
         self.specific_heat_liquid = specific_heat_liquid
         self.specific_heat_vapor = specific_heat_vapor
 
+def _vapor_pressure(coeffs, T):
+    return 101.325 * np.exp(np.multiply.outer((T - 300)/100, coeffs))
+
 class VLEData:
+    # pressures and mole_fractions are (n_temperatures, n_components) arrays
+    # with columns in the same order as components.
     def __init__(self, components, temperatures, pressures, mole_fractions):
         self.components = components
         self.temperatures = temperatures
         self.pressures = pressures
         self.mole_fractions = mole_fractions
+        self.coeffs = np.array([comp.vapor_pressure_coeff for comp in components])
 
     def get_pressure(self, T):
-        P = {}
-        for comp in self.components:
-            P[comp.name] = 101.325 * np.exp(comp.vapor_pressure_coeff * (T - 300)/100)
-        return P
+        return _vapor_pressure(self.coeffs, T)
 
 class DistillationStage:
     def __init__(self, stage_number, feed, reflux, distillate, bottoms, temperature, pressure, compositions):
@@ -36,97 +38,114 @@ class DistillationStage:
         self.temperature = temperature
         self.pressure = pressure
         self.compositions = compositions
+        self._Q = None
+        self._tot_vapor = None
+        self._tot_liquid = None
 
 class DistillationColumn:
     def __init__(self, components, feed, num_stages, feed_stage, condenser_type, reboiler_type):
         self.components = components
         self.feed = feed
+        self.feed_arr = np.asarray([feed[comp.name] for comp in components], dtype=np.float64)
         self.num_stages = num_stages
         self.feed_stage = feed_stage
         self.condenser_type = condenser_type
         self.reboiler_type = reboiler_type
+        self._rng = np.random.default_rng(0)
         self.vle = self.generate_vle_data()
+        self.K_table = self.equilibrium_ratio(300 + 10 * np.arange(num_stages + 1))
+        self.cp_vap = np.array([comp.specific_heat_vapor for comp in components])
+        self.cp_liq = np.array([comp.specific_heat_liquid for comp in components])
+        self.comp_arr = np.zeros((num_stages + 1, len(components), 2))
         self.stages = []
         self.cost = 0
 
     def generate_vle_data(self):
         temperatures = np.linspace(300, 400, 11)
-        pressures = []
-        mole_fractions = []
-        for T in temperatures:
-            P = {}
-            x = {}
-            for comp in self.components:
-                P[comp.name] = 101.325 * np.exp(comp.vapor_pressure_coeff * (T - 300)/100)
-                x[comp.name] = np.random.uniform(0.1, 0.9)
-            pressures.append(P)
-            mole_fractions.append(x)
+        coeffs = np.array([comp.vapor_pressure_coeff for comp in self.components])
+        pressures = _vapor_pressure(coeffs, temperatures)
+        mole_fractions = self._rng.uniform(0.1, 0.9, (len(temperatures), len(self.components)))
         return VLEData(self.components, temperatures, pressures, mole_fractions)
 
     def equilibrium_ratio(self, T):
-        ratios = {}
-        for comp in self.components:
-            ratios[comp.name] = self.vle.get_pressure(T)[comp.name] / 101.325
-        return ratios
+        return self.vle.get_pressure(T) / 101.325
+
+    def stage_flows(self, stage_numbers, reflux_ratio):
+        stage_numbers = np.asarray(stage_numbers)
+        if stage_numbers.min() < 0 or stage_numbers.max() > self.num_stages:
+            K = self.equilibrium_ratio(300 + stage_numbers * 10)
+        else:
+            K = self.K_table[stage_numbers]
+        vapor = K * self.feed_arr * reflux_ratio
+        return np.stack((vapor, self.feed_arr - vapor), axis=-1)
+
+    def _energy_balance(self, compositions, T):
+        vapor, liquid = compositions[..., 0], compositions[..., 1]
+        return T * (np.einsum('...c,c->...', vapor, self.cp_vap) - np.einsum('...c,c->...', liquid, self.cp_liq))
 
     def energy_balance(self, stage):
-        Q = 0
-        for comp in self.components:
-            Q += stage.compositions[comp.name]['vapor'] * comp.specific_heat_vapor * stage.temperature
-            Q -= stage.compositions[comp.name]['liquid'] * comp.specific_heat_liquid * stage.temperature
-        return Q
+        return self._energy_balance(stage.compositions, stage.temperature)
+
+    def column_energy_balance(self, T):
+        return self._energy_balance(self.comp_arr[1:], T)
+
+    def _mass_balance(self, compositions):
+        return compositions.sum(axis=-2)
 
     def mass_balance(self, stage):
-        total_vapor = sum([comp['vapor'] for comp in stage.compositions.values()])
-        total_liquid = sum([comp['liquid'] for comp in stage.compositions.values()])
+        total_vapor, total_liquid = self._mass_balance(stage.compositions)
         return total_vapor, total_liquid
 
     def cost_function(self, reflux_ratio):
-        total_cost = 0
-        for stage in range(1, self.num_stages + 1):
-            stage_cost = reflux_ratio * stage
-            total_cost += stage_cost
-        return total_cost
+        return reflux_cost(reflux_ratio, self.num_stages)
 
     def optimize_reflux_ratio(self):
-        result = minimize(self.cost_function, 1.5, bounds=[(1.0, 10.0)])
-        return result.x[0]
+        if type(self).cost_function is DistillationColumn.cost_function:
+            return solve_default_reflux(self.num_stages, 1.0, 10.0)
+        return solve_reflux(self.cost_function, 1.0, 10.0, 1.5)
 
     def simulate_stage(self, stage_number, reflux_ratio):
         T = 300 + stage_number * 10
         P = 101.325
-        ratios = self.equilibrium_ratio(T)
-        compositions = {}
-        for comp in self.components:
-            vapor = ratios[comp.name] * self.feed[comp.name] * reflux_ratio
-            liquid = self.feed[comp.name] - vapor
-            compositions[comp.name] = {'vapor': vapor, 'liquid': liquid}
+        compositions = self.stage_flows(stage_number, reflux_ratio)
+        if 0 <= stage_number <= self.num_stages:
+            self.comp_arr[stage_number] = compositions
         stage = DistillationStage(stage_number, self.feed, reflux_ratio, 0, 0, T, P, compositions)
-        Q = self.energy_balance(stage)
-        total_vapor, total_liquid = self.mass_balance(stage)
-        self.cost += Q
+        stage._Q = self.energy_balance(stage)
+        stage._tot_vapor, stage._tot_liquid = self.mass_balance(stage)
+        self.cost += stage._Q
         self.stages.append(stage)
 
-    def simulate(self):
+    def simulate(self, plot=False):
         optimized_reflux = self.optimize_reflux_ratio()
-        for stage in range(1, self.num_stages + 1):
-            self.simulate_stage(stage, optimized_reflux)
-        data = []
-        for stage in self.stages:
-            data.append({
-                'Stage': stage.stage_number,
-                'Temperature (K)': stage.temperature,
-                'Pressure (kPa)': stage.pressure,
-                'Reflux Ratio': optimized_reflux,
-                'Energy Balance': self.energy_balance(stage),
-                'Total Vapor Flow': self.mass_balance(stage)[0],
-                'Total Liquid Flow': self.mass_balance(stage)[1]
-            })
-        df = pd.DataFrame(data)
-        df.to_csv('stage_by_stage_results.csv', index=False)
-        self.plot_results(df)
+        stage_numbers = np.arange(1, self.num_stages + 1)
+        T = 300 + stage_numbers * 10
+        P = np.full(self.num_stages, 101.325)
+        self.comp_arr[1:] = self.stage_flows(stage_numbers, optimized_reflux)
+        totals = self._mass_balance(self.comp_arr[1:])
+        Q = self.column_energy_balance(T)
+        for s in range(self.num_stages):
+            stage = DistillationStage(int(stage_numbers[s]), self.feed, optimized_reflux, 0, 0, int(T[s]), float(P[s]), self.comp_arr[s + 1].copy())
+            stage._Q = Q[s]
+            stage._tot_vapor, stage._tot_liquid = totals[s]
+            self.stages.append(stage)
+        self.cost += Q.sum()
+        df = pd.DataFrame({
+            'Stage': stage_numbers,
+            'Temperature (K)': T,
+            'Pressure (kPa)': P,
+            'Reflux Ratio': np.full(self.num_stages, optimized_reflux),
+            'Energy Balance': Q,
+            'Total Vapor Flow': totals[:, 0],
+            'Total Liquid Flow': totals[:, 1]
+        })
+        with open('stage_by_stage_results.csv', 'w', buffering=1 << 20, newline='') as f:
+            df.to_csv(f, index=False)
+        if plot:
+            self.plot_results(df)
 
     def plot_results(self, df):
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(10,6))
         plt.plot(df['Stage'], df['Temperature (K)'], label='Temperature')
         plt.plot(df['Stage'], df['Pressure (kPa)'], label='Pressure')
@@ -145,7 +164,7 @@ def main():
     ]
     feed = {'A': 0.5, 'B': 0.3, 'C': 0.2}
     column = DistillationColumn(components, feed, num_stages=30, feed_stage=15, condenser_type='partial', reboiler_type='steam')
-    column.simulate()
+    column.simulate(plot=True)
 
 if __name__ == "__main__":
     main()